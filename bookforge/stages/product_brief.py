@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import argparse
+import copy
 import json
+import os
 import re
 import sys
 from io import StringIO
@@ -26,14 +28,22 @@ class AlwaysFoldDumper(yaml.SafeDumper):
     """
     - Запрещаем indentless-режим (исправляет '-  value').
     - Всегда представляем строки как folded block scalars ('>') с переносами.
+    - База — чистый SafeDumper: C-эмиттер (CSafeDumper) не вызывает
+      increase_indent и пишет indentless-последовательности, что ломает yamllint.
     """
     def increase_indent(self, flow: bool = False, indentless: bool = False):
         return super().increase_indent(flow, indentless=False)
 
+    def ignore_aliases(self, data: Any) -> bool:
+        # Общие поддеревья (см. _prepare_strings_folded) пишем целиком, без &id/*id
+        return True
+
 def _wrap_text(s: str, width: int = 72) -> str:
     """
     Жёстко переносим длинные строки по пробелам до ширины width.
     Если уже есть переносы — уважаем их.
+    Ручной цикл намеренно: textwrap.TextWrapper в ~5 раз медленнее и
+    доклеивает начало длинного слова к текущей строке.
     """
     s = s.replace("\t", " ")
     if "\n" in s or len(s) <= width:
@@ -67,13 +77,29 @@ def _wrap_text(s: str, width: int = 72) -> str:
 def _prepare_strings_folded(obj: Any, width: int = 72) -> Any:
     """
     Рекурсивно оборачиваем ВСЕ строки в folded-блоки, добавляя переносы.
+    Copy-on-write: контейнер копируется, только если в нём изменилась строка;
+    неизменённые поддеревья возвращаются как есть, вход не мутируется.
     """
-    if isinstance(obj, dict):
-        return {k: _prepare_strings_folded(v, width) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_prepare_strings_folded(v, width) for v in obj]
     if isinstance(obj, str):
         return _wrap_text(obj, width)
+    if isinstance(obj, dict):
+        out = None
+        for k, v in obj.items():
+            nv = _prepare_strings_folded(v, width)
+            if nv is not v:
+                if out is None:
+                    out = dict(obj)
+                out[k] = nv
+        return obj if out is None else out
+    if isinstance(obj, list):
+        out_list = None
+        for i, v in enumerate(obj):
+            nv = _prepare_strings_folded(v, width)
+            if nv is not v:
+                if out_list is None:
+                    out_list = list(obj)
+                out_list[i] = nv
+        return obj if out_list is None else out_list
     return obj
 
 def _represent_str_as_folded(dumper: yaml.Dumper, data: str):
@@ -84,20 +110,40 @@ AlwaysFoldDumper.add_representer(str, _represent_str_as_folded)
 
 _HYPHEN_FIX_RE = re.compile(r"^(\s*)- {2,}(?=\S)", re.MULTILINE)
 
-def dump_yaml_pretty_str(data: Dict[str, Any]) -> str:
+def _fix_hyphens(s: str) -> str:
+    # Без '-  ' регэксп заведомо не сработает — дешёвая проверка вместо прохода
+    if "-  " not in s:
+        return s
+    return _HYPHEN_FIX_RE.sub(r"\1- ", s)
+
+class _HyphenFixWriter:
     """
-    Возвращает YAML строку, дружелюбную к yamllint:
-      - explicit_start: '---'
-      - indent=4
-      - width=78 (сам YAML), строки уже порезаны до 72
-      - default_flow_style=False
-      - убираем возможные двойные пробелы после '-'
+    Потоковый адаптер для yaml.dump: копит вывод до '\n' и применяет
+    _fix_hyphens к готовым строкам, сразу отдавая их в fh.
     """
+    def __init__(self, fh: Any) -> None:
+        self.fh = fh
+        self.buf = ""
+
+    def write(self, data: str) -> None:
+        self.buf += data
+        if "\n" not in data:
+            return
+        head, sep, self.buf = self.buf.rpartition("\n")
+        self.fh.write(_fix_hyphens(head + sep))
+
+    def flush(self) -> None:
+        if self.buf:
+            self.fh.write(_fix_hyphens(self.buf))
+            self.buf = ""
+        self.fh.flush()
+
+def _dump_yaml_pretty(data: Dict[str, Any], fh: Any) -> None:
     prepared = _prepare_strings_folded(data, width=72)
-    buf = StringIO()
+    writer = _HyphenFixWriter(fh)
     yaml.dump(
         prepared,
-        buf,
+        writer,
         Dumper=AlwaysFoldDumper,
         sort_keys=False,
         allow_unicode=True,
@@ -106,20 +152,126 @@ def dump_yaml_pretty_str(data: Dict[str, Any]) -> str:
         width=78,
         indent=4,
     )
-    s = buf.getvalue()
-    s = _HYPHEN_FIX_RE.sub(r"\1- ", s)
-    return s
+    writer.flush()
+
+def dump_yaml_pretty_str(data: Dict[str, Any]) -> str:
+    """
+    Возвращает YAML строку, дружелюбную к yamllint:
+      - explicit_start: '---'
+      - indent=4
+      - width=78 (сам YAML), строки уже порезаны до 72
+      - default_flow_style=False
+      - убираем возможные двойные пробелы после '-'
+    """
+    buf = StringIO()
+    _dump_yaml_pretty(data, buf)
+    return buf.getvalue()
 
 def dump_yaml_pretty_file(data: Dict[str, Any], path: Path) -> None:
+    """
+    То же, что dump_yaml_pretty_str, но потоком в соседний временный файл,
+    который затем атомарно (os.replace) заменяет path. Если дамп упал,
+    прежний файл остаётся нетронутым.
+    fsync не делается; если нужна durability — вызывающий делает os.fsync сам.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
-    text = dump_yaml_pretty_str(data)
-    path.write_text(text, encoding="utf-8")
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8", buffering=1 << 16) as fh:
+            _dump_yaml_pretty(data, fh)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
 
 
 # ==================================
 # Deterministic content (Stage 1)
 # ==================================
 
+# Константная часть брифа. Вложенные списки/словари общие для всех вызовов
+# _deterministic_yaml_from_input — результат не мутировать.
+_BRIEF_TEMPLATE: Dict[str, Any] = {
+    "topic": "",
+    "positioning": {
+        "for_whom": "",
+        "problem_jobs": [
+            "Быстрое, воспроизводимое создание книги с контролем качества"
+        ],
+        "unique_angle": "Инженерный пайплайн с KPI и автоматическими проверками качества",
+    },
+    "audience": {
+        "primary": "",
+        "secondary": "",
+        "prerequisites": ["Базовые знания Git", "Опыт чтения YAML/JSON"],
+    },
+    "scope": {
+        "target_pages": 0,
+        "page_budget": [],
+        "in_scope": ["Дизайн ролей агентов и их промптов"],
+        "out_of_scope": ["Обучение собственных LLM с нуля"],
+    },
+    "reader_questions": [
+        "Как быстро получить рабочий пайплайн книги под ключ?",
+        "Какие роли агентов обязательны и как они взаимодействуют?",
+        "Как измерять качество и ловить деградации?",
+    ],
+    "objectives": [
+        "Зафиксировать архитектуру и роли (≤10 страниц) к концу Части I",
+        "Собрать MVP пайплайна с автопроверками к концу Части II",
+        "Покрытие упражнений ≥20% страниц к завершению Части III",
+        "Экспорт DOCX/PDF/EPUB без ошибок к финалу проекта",
+    ],
+    "structure_outline": [
+        {
+            "part": "I. Концепт и бриф",
+            "chapters": ["Позиционирование", "Карта ролей", "Контракты I/O"],
+        },
+        {
+            "part": "II. Архитектура агентов",
+            "chapters": ["Оркестрация", "Хранилище и версии", "Промпт-инжиниринг"],
+        },
+        {
+            "part": "III. Качество и продакшн",
+            "chapters": ["KPI и метрики", "Проверки и тесты", "CI/CD публикации"],
+        },
+        {
+            "part": "IV. Кейсы и чек-листы",
+            "chapters": ["Внедрение A", "Внедрение B", "Антипаттерны"],
+        },
+    ],
+    "outputs": [],
+    "acceptance_criteria": {
+        "readability": {
+            "max_sentence_avg": 17,
+            "passive_voice_max": 8,
+            "simple_words_min": 75,
+        },
+        "structure": {
+            "chapter_len_variance_max": 20,
+            "each_chapter_has": ["hook", "objective", "example", "checkpoint"],
+        },
+        "factuality": {
+            "claim_evidence_coverage_min": 80,
+            "zero_critical_errors_sample": 30,
+        },
+        "applicability": {"exercises_share_min": 20, "case_studies_min": 6},
+        "production": {
+            "styles_validated": True,
+            "export_success": ["DOCX", "PDF", "EPUB"],
+        },
+    },
+    "risks_assumptions": {
+        "risks": ["Зависимость от нестабильных LLM-API"],
+        "mitigations": ["Кэширование, версионирование промптов и шаблонов"],
+        "assumptions": ["Доступна инфраструктура CI/CD"],
+    },
+    "workflow_notes": {
+        "sources_policy": "Каждый факт имеет ссылку на проверяемый источник",
+        "glossary_policy": "Термины вводятся при первом употреблении и сводятся в глоссарий",
+    },
+}
+
 def _deterministic_yaml_from_input(payload: Dict[str, Any]) -> Dict[str, Any]:
     """Фолбэк-генератор YAML без LLM: собирает корректный скелет под валидацию."""
     topic: str = payload["topic"]
@@ -138,91 +290,21 @@ def _deterministic_yaml_from_input(payload: Dict[str, Any]) -> Dict[str, Any]:
         p2 = max(40, p2 - delta)
         p4 = 10
 
-    data = {
-        "topic": topic,
-        "positioning": {
-            "for_whom": audience,
-            "problem_jobs": [
-                "Быстрое, воспроизводимое создание книги с контролем качества"
-            ],
-            "unique_angle": "Инженерный пайплайн с KPI и автоматическими проверками качества",
-        },
-        "audience": {
-            "primary": audience,
-            "secondary": "",
-            "prerequisites": ["Базовые знания Git", "Опыт чтения YAML/JSON"],
-        },
-        "scope": {
-            "target_pages": target_pages,
-            "page_budget": [
-                {"part": "I. Концепт и бриф", "pages": p1},
-                {"part": "II. Архитектура", "pages": p2},
-                {"part": "III. Качество и продакшн", "pages": p3},
-                {"part": "IV. Кейсы и чек-листы", "pages": p4},
-            ],
-            "in_scope": ["Дизайн ролей агентов и их промптов"],
-            "out_of_scope": ["Обучение собственных LLM с нуля"],
-        },
-        "reader_questions": [
-            "Как быстро получить рабочий пайплайн книги под ключ?",
-            "Какие роли агентов обязательны и как они взаимодействуют?",
-            "Как измерять качество и ловить деградации?",
+    data = copy.copy(_BRIEF_TEMPLATE)
+    data["topic"] = topic
+    data["positioning"] = {**_BRIEF_TEMPLATE["positioning"], "for_whom": audience}
+    data["audience"] = {**_BRIEF_TEMPLATE["audience"], "primary": audience}
+    data["scope"] = {
+        **_BRIEF_TEMPLATE["scope"],
+        "target_pages": target_pages,
+        "page_budget": [
+            {"part": "I. Концепт и бриф", "pages": p1},
+            {"part": "II. Архитектура", "pages": p2},
+            {"part": "III. Качество и продакшн", "pages": p3},
+            {"part": "IV. Кейсы и чек-листы", "pages": p4},
         ],
-        "objectives": [
-            "Зафиксировать архитектуру и роли (≤10 страниц) к концу Части I",
-            "Собрать MVP пайплайна с автопроверками к концу Части II",
-            "Покрытие упражнений ≥20% страниц к завершению Части III",
-            "Экспорт DOCX/PDF/EPUB без ошибок к финалу проекта",
-        ],
-        "structure_outline": [
-            {
-                "part": "I. Концепт и бриф",
-                "chapters": ["Позиционирование", "Карта ролей", "Контракты I/O"],
-            },
-            {
-                "part": "II. Архитектура агентов",
-                "chapters": ["Оркестрация", "Хранилище и версии", "Промпт-инжиниринг"],
-            },
-            {
-                "part": "III. Качество и продакшн",
-                "chapters": ["KPI и метрики", "Проверки и тесты", "CI/CD публикации"],
-            },
-            {
-                "part": "IV. Кейсы и чек-листы",
-                "chapters": ["Внедрение A", "Внедрение B", "Антипаттерны"],
-            },
-        ],
-        "outputs": outputs,
-        "acceptance_criteria": {
-            "readability": {
-                "max_sentence_avg": 17,
-                "passive_voice_max": 8,
-                "simple_words_min": 75,
-            },
-            "structure": {
-                "chapter_len_variance_max": 20,
-                "each_chapter_has": ["hook", "objective", "example", "checkpoint"],
-            },
-            "factuality": {
-                "claim_evidence_coverage_min": 80,
-                "zero_critical_errors_sample": 30,
-            },
-            "applicability": {"exercises_share_min": 20, "case_studies_min": 6},
-            "production": {
-                "styles_validated": True,
-                "export_success": ["DOCX", "PDF", "EPUB"],
-            },
-        },
-        "risks_assumptions": {
-            "risks": ["Зависимость от нестабильных LLM-API"],
-            "mitigations": ["Кэширование, версионирование промптов и шаблонов"],
-            "assumptions": ["Доступна инфраструктура CI/CD"],
-        },
-        "workflow_notes": {
-            "sources_policy": "Каждый факт имеет ссылку на проверяемый источник",
-            "glossary_policy": "Термины вводятся при первом употреблении и сводятся в глоссарий",
-        },
     }
+    data["outputs"] = outputs
     return data
 
 
@@ -25,17 +25,24 @@ CLI:
     --max-para N            Override max sentences per paragraph
     --passive-allow         Allow passive voice
     --require-metrics 0|1   Toggle vague-claim metric requirement
+    --no-cache              Do not read/write the result cache (.cache/style_lint)
 
 Exit codes: 0 ok, 1 errors, 2 usage/no files.
 """
 from __future__ import annotations
 import argparse
 import fnmatch
+import functools
+import hashlib
+import io
 import json
+import os
 import re
+import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, TextIO, Tuple
 
 try:
     import yaml
@@ -43,8 +50,22 @@ except ImportError:
     print("[ERR] PyYAML not installed. Run: pip install pyyaml", file=sys.stderr)
     sys.exit(2)
 
+# Prefer the libyaml-backed loader when available; the result is identical.
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+# Optional: pyahocorasick speeds up banned-phrase scanning; plain `in` otherwise.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 ROOT = Path(__file__).resolve().parents[1]
 CFG  = ROOT / "config/style.yaml"
+CACHE_DIR = ROOT / ".cache/style_lint"
+PARALLEL_MIN_FILES = 4  # lint in worker processes above this many cache misses
 
 # --- RU sentence splitting with common abbrev guards ---
 # NOTE: avoid variable-width lookbehind. Split first, then merge on abbreviations.
@@ -52,6 +73,7 @@ ABBREV_LIST = [
     "т.е.", "т.к.", "и т.д.", "и т.п.", "д.р.",
     "г.", "стр.", "рис.",
 ]
+_ABBREV_TUPLE = tuple(ABBREV_LIST)  # str.endswith() takes a tuple in one C call
 SENT_SPLIT_SIMPLE_RE = re.compile(r"(?<=[.!?])\s+")
 WORD_RE = re.compile(r"[А-Яа-яA-Za-z0-9ёЁ\-]+")
 
@@ -72,6 +94,12 @@ VAGUE_CLAIMS = [
 VAGUE_RE = re.compile("|".join(VAGUE_CLAIMS), re.IGNORECASE)
 METRIC_RE = re.compile(r"\d+\s?(%|мин|час|дн|шаг|правил|MB|GB|стр|сек)\b", re.IGNORECASE)
 
+# Hot-path patterns, compiled once instead of per sentence/file
+_ROUTER_RE = re.compile(r"\brouter\b", re.IGNORECASE)
+_TRAIL_WS_RE_B = re.compile(rb"[ \t]+$", re.MULTILINE)
+_BLANKS_RE_B = re.compile(rb"\n{3,}")
+_PARA_SPLIT_RE = re.compile(r"\n\s*\n")
+
 TERMINOLOGY_KEYS = [
     "агент", "оркестратор", "планировщик", "критик", "редактор", "рутер",
     "память", "контекстное_окно", "RAG", "инструмент", "политика",
@@ -79,30 +107,38 @@ TERMINOLOGY_KEYS = [
     "чеклист", "дедупликация", "грейдинг"
 ]
 
+TARGET_SUFFIXES = (".md", ".txt")
+
 # Default exclude globs to avoid vendor/venv noise
 DEFAULT_EXCLUDES = [
     ".venv/**", ".pytest_cache/**", "build/**", "dist/**", ".git/**",
     "node_modules/**", "**/__pycache__/**", "**/site-packages/**", "**/*.dist-info/**",
 ]
+# Dir names that DEFAULT_EXCLUDES reject without regex work:
+# top-level only ("build/**") vs. below any parent ("**/__pycache__/**")
+_DEFAULT_EXCLUDE_SET = frozenset(DEFAULT_EXCLUDES)
+_TOP_EXCLUDE_DIRS = frozenset({".venv", ".pytest_cache", "build", "dist", ".git", "node_modules"})
+_NESTED_EXCLUDE_DIRS = frozenset({"__pycache__", "site-packages"})
 
 def load_cfg() -> Dict[str, Any]:
     if not CFG.exists():
         print(f"[ERR] Missing {CFG}", file=sys.stderr)
         sys.exit(2)
     with open(CFG, "r", encoding="utf-8") as f:
-        cfg = yaml.safe_load(f)
+        cfg = yaml.load(f, Loader=_SafeLoader)
     return cfg or {}
 
 def split_paragraphs(text: str) -> List[str]:
-    parts = re.split(r"\n\s*\n", text.strip())
+    # Kept on the compiled regex: it also treats whitespace-only lines as blank,
+    # and benchmarks no slower than str.split("\n\n") plus a guard for them.
+    parts = _PARA_SPLIT_RE.split(text.strip())
     return [p.strip() for p in parts if p.strip()]
 
 def _ends_with_abbrev(chunk: str) -> bool:
-    s = chunk.strip()
-    # Normalize spacing for multi-token abbreviations (e.g., "и т.д.")
-    s_norm = re.sub(r"\s+", " ", s)
-    s_norm_lower = s_norm.lower()
-    return any(s_norm_lower.endswith(abbr) for abbr in ABBREV_LIST)
+    # Normalize spacing for multi-token abbreviations (e.g., "и т.д.").
+    # Abbrevs hold at most one space, so the last two tokens decide the match.
+    tail = " ".join(chunk.rsplit(None, 2)[-2:])
+    return tail.lower().endswith(_ABBREV_TUPLE)
 
 def split_sentences(para: str) -> List[str]:
     # First naive split by punctuation + whitespace
@@ -122,6 +158,8 @@ def split_sentences(para: str) -> List[str]:
     return merged
 
 def word_count(s: str) -> int:
+    # len(s.split()) is faster but counts "—" and splits "т.е." differently;
+    # every exact guard for a split() fast path benchmarked slower than findall.
     return len(WORD_RE.findall(s))
 
 def has_metric_nearby(s: str) -> bool:
@@ -151,33 +189,93 @@ def collect_banned(cfg: Dict[str, Any]) -> List[str]:
             seen.add(key)
     return out
 
-def _is_excluded(path: Path, excludes: List[str], root: Path) -> bool:
-    abs_path = path.resolve()
+def build_banned_matcher(banned_norm: List[str]) -> Any:
+    """Aho–Corasick automaton over normalized phrases (None without pyahocorasick)."""
+    if ahocorasick is None or not banned_norm:
+        return None
+    automaton = ahocorasick.Automaton()
+    for i, pnorm in enumerate(banned_norm):
+        automaton.add_word(pnorm, i)
+    automaton.make_automaton()
+    return automaton
+
+def find_banned(norm_para: str, banned_norm: List[str], matcher: Any = None) -> List[int]:
+    """Indices of banned phrases found in the paragraph, in config order."""
+    if matcher is None:
+        return [i for i, pnorm in enumerate(banned_norm) if pnorm and pnorm in norm_para]
+    return sorted({i for _, i in matcher.iter(norm_para)})
+
+@functools.lru_cache(maxsize=None)
+def _exclude_re(excludes: Tuple[str, ...]) -> re.Pattern[str]:
+    # One alternation of all globs, compiled once per exclude set
+    return re.compile("|".join(f"(?:{fnmatch.translate(os.path.normcase(p))})" for p in excludes))
+
+def _rel_to(path: Path, root: Path) -> str:
     try:
-        rel = str(abs_path.relative_to(root))
+        rel = str(path.relative_to(root))
     except ValueError:
-        rel = str(abs_path)
-    # check file path and parents against patterns
-    for pat in excludes:
-        if fnmatch.fnmatch(rel, pat):
+        rel = str(path)
+    return os.path.normcase(rel)
+
+def _dir_excluded(rel_dir: str, pat: re.Pattern[str]) -> bool:
+    # A matching dir excludes every file below it (see _is_excluded parents loop)
+    return bool(pat.match(rel_dir) or pat.match(rel_dir + "/"))
+
+def _is_excluded(path: Path, excludes: List[str], root: Path) -> bool:
+    abs_path = path.resolve()
+    rel = _rel_to(abs_path, root)
+    # fast path: default vendor/venv dirs, exactly as DEFAULT_EXCLUDES would match
+    if _DEFAULT_EXCLUDE_SET.issubset(excludes):
+        dirs = Path(rel).parts[:-1]
+        if dirs and (dirs[0] in _TOP_EXCLUDE_DIRS
+                     or not _NESTED_EXCLUDE_DIRS.isdisjoint(dirs[1:])):
             return True
-    for parent in abs_path.parents:
-        try:
-            relp = str(parent.relative_to(root))
-        except ValueError:
-            relp = str(parent)
-        for pat in excludes:
-            if fnmatch.fnmatch(relp, pat) or fnmatch.fnmatch(relp + "/", pat):
-                return True
-    return False
+    pat = _exclude_re(tuple(excludes))
+    # check file path and parents against patterns
+    if pat.match(rel):
+        return True
+    return any(_dir_excluded(_rel_to(parent, root), pat) for parent in abs_path.parents)
+
+def _walk_targets(top: Path, excludes: List[str], root: Path) -> List[Path]:
+    """
+    Single os.walk for .md/.txt that prunes excluded dirs instead of descending.
+    Symlinks inside a pruned dir are never seen, even if they point at a
+    non-excluded file (the old rglob walk linted such targets).
+    """
+    pat = _exclude_re(tuple(excludes))
+    top = top.resolve()
+    if any(_dir_excluded(_rel_to(d, root), pat) for d in (top, *top.parents)):
+        return []
+    files: List[Path] = []
+    for dirpath, dirnames, filenames in os.walk(top):
+        rel_dir = _rel_to(Path(dirpath), root)
+        sub = "" if rel_dir == "." else rel_dir + os.sep
+        dirnames[:] = [d for d in dirnames if not _dir_excluded(sub + d, pat)]
+        for fn in filenames:
+            if not fn.endswith(TARGET_SUFFIXES):
+                continue
+            f = Path(dirpath, fn)
+            if os.path.islink(f):
+                # judged by its target, as _is_excluded resolves the path
+                excluded = _is_excluded(f, excludes, root)
+            else:
+                excluded = bool(pat.match(sub + fn))
+            if not excluded and f.is_file():
+                files.append(f)
+    return files
 
 def check_file(path: Path, cfg: Dict[str, Any],
+               banned: List[str], banned_norm: List[str],
                sr: Tuple[int,int], max_sent_len: int, max_para_sents: int,
-               passive_allowed: bool, require_metrics: bool) -> Dict[str, Any]:
-    text = path.read_text(encoding="utf-8", errors="ignore")
+               passive_allowed: bool, require_metrics: bool,
+               banned_matcher: Any = None, data: bytes | None = None) -> Dict[str, Any]:
+    # banned/banned_norm/banned_matcher: computed once per run in main()
+    # data: raw file bytes when the caller already read them (see check_file_keyed)
+    if data is None:
+        data = path.read_bytes()
+    # same as read_text(encoding="utf-8", errors="ignore") with universal newlines
+    text = data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
     paragraphs = split_paragraphs(text)
-    banned = collect_banned(cfg)
-    banned_norm = [normalize(p) for p in banned]
 
     issues: List[Dict[str, Any]] = []
     for pi, para in enumerate(paragraphs, 1):
@@ -187,10 +285,9 @@ def check_file(path: Path, cfg: Dict[str, Any],
                            "msg":f"В абзаце {len(sents)} предложений (макс {max_para_sents})."})
         # banned phrases
         norm_para = normalize(para)
-        for phrase, pnorm in zip(banned, banned_norm):
-            if pnorm and pnorm in norm_para:
-                issues.append({"level":"ERROR","type":"banned","para":pi,
-                               "msg":f"Запрещённая фраза: '{phrase}'"})
+        for i in find_banned(norm_para, banned_norm, banned_matcher):
+            issues.append({"level":"ERROR","type":"banned","para":pi,
+                           "msg":f"Запрещённая фраза: '{banned[i]}'"})
 
         # sentence-level checks
         for si, s in enumerate(sents, 1):
@@ -201,26 +298,66 @@ def check_file(path: Path, cfg: Dict[str, Any],
             elif wc < sr[0] or wc > sr[1]:
                 issues.append({"level":"INFO","type":"sentence_target","para":pi,"sent":si,
                                "msg":f"{wc} слов (целевой диапазон {sr[0]}–{sr[1]})."})
+            # Separate searches on purpose: a fused named-group alternation needs a
+            # zero-width lookahead to keep overlapping hits and benchmarked slower.
             if not passive_allowed and PASSIVE_RE.search(s):
                 issues.append({"level":"WARN","type":"passive","para":pi,"sent":si,
                                "msg":"Подозрение на пассивный залог."})
             if require_metrics and VAGUE_RE.search(s) and not has_metric_nearby(s):
                 issues.append({"level":"WARN","type":"vague_no_metric","para":pi,"sent":si,
                                "msg":"Оценка без метрики рядом."})
-            if re.search(r"\brouter\b", s, re.IGNORECASE):
+            if _ROUTER_RE.search(s):
                 issues.append({"level":"INFO","type":"terminology","para":pi,"sent":si,
                                "msg":"Используй 'рутер' из глоссария."})
 
-    found_terms = {t: (t.lower() in text.lower()) for t in TERMINOLOGY_KEYS}
+    text_lower = text.lower()
+    found_terms = {t: (t.lower() in text_lower) for t in TERMINOLOGY_KEYS}
     return {"file": str(path), "issues": issues, "term_coverage": found_terms}
 
-def render_md(results: List[Dict[str, Any]]) -> Tuple[str, int]:
-    lines = ["# Style Lint Report\n"]
+def content_key(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def check_file_keyed(path: Path, **kwargs: Any) -> Tuple[str, Dict[str, Any]]:
+    # Reads the file once and hashes exactly the bytes that get linted, so a
+    # file edited after the cache lookup is never stored under a stale key
+    data = path.read_bytes()
+    return content_key(data), check_file(path, data=data, **kwargs)
+
+def cfg_cache_key(cfg: Dict[str, Any], params: List[Any]) -> str:
+    # The linter's own source is part of the key: any change to the rules
+    # or to check_file invalidates old results without a manual version bump
+    source = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=16).hexdigest()
+    blob = json.dumps([source, cfg, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(blob.encode("utf-8")).hexdigest()[:8]
+
+def cache_load(cache_dir: Path, key: str) -> Dict[str, Any] | None:
+    try:
+        with open(cache_dir / f"{key}.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def cache_store(cache_dir: Path, key: str, result: Dict[str, Any]) -> None:
+    # Best effort: a failed write only costs a re-lint next time
+    path = cache_dir / f"{key}.json"
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def render_md(results: List[Dict[str, Any]], out: TextIO | None = None) -> Tuple[str | None, int]:
+    # Writes straight into `out` (e.g. sys.stdout) when given; otherwise returns the text
+    buf = out if out is not None else io.StringIO()
+    w = buf.write
+    w("# Style Lint Report\n\n")
     total_err = 0
     for r in results:
-        lines.append(f"## {r['file']}")
+        w(f"## {r['file']}\n")
         if not r["issues"]:
-            lines.append("✔ Без замечаний.\n")
+            w("✔ Без замечаний.\n\n")
             continue
         for it in r["issues"]:
             if it["level"] == "ERROR":
@@ -229,29 +366,44 @@ def render_md(results: List[Dict[str, Any]]) -> Tuple[str, int]:
             if "para" in it: loc.append(f"абз. {it['para']}")
             if "sent" in it: loc.append(f"предл. {it['sent']}")
             where = (" ("+", ".join(loc)+")") if loc else ""
-            lines.append(f"- **{it['level']}**{where}: {it['msg']}")
+            w(f"- **{it['level']}**{where}: {it['msg']}\n")
         missing = [k for k,v in r["term_coverage"].items() if not v]
         if missing:
-            lines.append("")
-            lines.append("_Подсказка_: не встречаются базовые термины: " + ", ".join(missing))
-        lines.append("")
-    return "\n".join(lines), total_err
+            w("\n_Подсказка_: не встречаются базовые термины: " + ", ".join(missing) + "\n")
+        w("\n")
+    return (buf.getvalue() if out is None else None), total_err
+
+def write_json_report(results: List[Dict[str, Any]], path: Path) -> None:
+    # Streams {"results": [...]} one file at a time instead of one big dumps();
+    # output is byte-identical to json.dumps(..., ensure_ascii=False, indent=2)
+    with open(path, "w", encoding="utf-8", buffering=1 << 16) as f:
+        if not results:
+            f.write('{\n  "results": []\n}')
+            return
+        f.write('{\n  "results": [\n')
+        for i, r in enumerate(results):
+            if i:
+                f.write(",\n")
+            # "\n" only appears as a structural break in indented JSON; unlike
+            # textwrap.indent this leaves U+0085/U+2028/U+2029 in values alone
+            f.write("    " + json.dumps(r, ensure_ascii=False, indent=2).replace("\n", "\n    "))
+        f.write("\n  ]\n}")
 
 def safe_autofix(path: Path) -> None:
     # Only whitespace fixes
-    txt = path.read_text(encoding="utf-8", errors="ignore")
-    txt = re.sub(r"[ \t]+$", "", txt, flags=re.MULTILINE)       # strip trailing spaces
-    txt = re.sub(r"\n{3,}", "\n\n", txt)                        # collapse >2 blank lines
-    path.write_text(txt, encoding="utf-8")
+    # Works on raw bytes: the fixes are ASCII-only, so no UTF-8 decode is needed
+    original = path.read_bytes()
+    data = original.replace(b"\r\n", b"\n").replace(b"\r", b"\n")  # as universal newlines
+    data = _TRAIL_WS_RE_B.sub(b"", data)       # strip trailing spaces
+    data = _BLANKS_RE_B.sub(b"\n\n", data)     # collapse >2 blank lines
+    if data == original:
+        return  # untouched files cost no write/journal traffic
+    # Single buffered write, no fsync: a lint fix does not need durability
+    with open(path, "wb", buffering=1 << 20) as f:
+        f.write(data)
 
 def iter_targets(args: argparse.Namespace) -> List[Path]:
     files: List[Path] = []
-    globs = []
-    if args.glob:
-        globs = [args.glob]
-    else:
-        globs = ["**/*.md", "**/*.txt"]
-
     excludes = list(DEFAULT_EXCLUDES)
     if args.exclude:
         excludes.extend(args.exclude)
@@ -262,11 +414,12 @@ def iter_targets(args: argparse.Namespace) -> List[Path]:
         if p.is_file():
             if not _is_excluded(p, excludes, ROOT):
                 files.append(p)
+        elif p.is_dir() and args.glob:
+            for f in p.rglob(args.glob):
+                if f.is_file() and not _is_excluded(f, excludes, ROOT):
+                    files.append(f)
         elif p.is_dir():
-            for g in globs:
-                for f in p.rglob(g):
-                    if f.is_file() and not _is_excluded(f, excludes, ROOT):
-                        files.append(f)
+            files.extend(_walk_targets(p, excludes, ROOT))
 
     uniq = sorted({f.resolve() for f in files})
     return [Path(u) for u in uniq]
@@ -283,6 +436,7 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--max-para", type=int, help="Max sentences per paragraph override")
     parser.add_argument("--passive-allow", action="store_true", help="Allow passive voice")
     parser.add_argument("--require-metrics", type=int, choices=[0,1], help="Require metrics near vague claims")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk result cache")
     return parser.parse_args()
 
 def main() -> int:
@@ -307,21 +461,54 @@ def main() -> int:
         print("[ERR] No .md/.txt files found.", file=sys.stderr)
         return 2
 
-    results = []
-    for p in targets:
+    banned = collect_banned(cfg)
+    banned_norm = [normalize(p) for p in banned]
+    banned_matcher = build_banned_matcher(banned_norm)
+
+    # Results are cached by (file content, config + effective options)
+    cache_dir = None
+    if not args.no_cache:
+        if args.fix:
+            shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        cache_dir = CACHE_DIR / cfg_cache_key(cfg, [
+            target_lo, target_hi, max_sent_len, max_para_sents, passive_allowed, require_metrics
+        ])
+
+    results: List[Dict[str, Any] | None] = []
+    misses: List[Tuple[int, Path]] = []
+    for i, p in enumerate(targets):
         if args.fix:
             safe_autofix(p)
-        results.append(check_file(
-            p, cfg,
-            (target_lo, target_hi), max_sent_len, max_para_sents,
-            passive_allowed, require_metrics
-        ))
+        if cache_dir is not None:
+            cached = cache_load(cache_dir, content_key(p.read_bytes()))
+            if cached is not None:
+                results.append({"file": str(p), **cached})
+                continue
+        results.append(None)
+        misses.append((i, p))
+
+    lint = functools.partial(
+        check_file_keyed, cfg=cfg, banned=banned, banned_norm=banned_norm,
+        sr=(target_lo, target_hi), max_sent_len=max_sent_len,
+        max_para_sents=max_para_sents, passive_allowed=passive_allowed,
+        require_metrics=require_metrics, banned_matcher=banned_matcher,
+    )
+    miss_paths = [p for _, p in misses]
+    # --fix stays serial: autofix mutates files
+    if len(miss_paths) > PARALLEL_MIN_FILES and not args.fix:
+        with ProcessPoolExecutor() as ex:
+            fresh = list(ex.map(lint, miss_paths, chunksize=8))
+    else:
+        fresh = [lint(p) for p in miss_paths]
+    for (i, _), (key, r) in zip(misses, fresh):
+        if cache_dir is not None:
+            cache_store(cache_dir, key, {k: v for k, v in r.items() if k != "file"})
+        results[i] = r
 
-    md, total_err = render_md(results)
-    print(md)
+    _, total_err = render_md(results, sys.stdout)
 
     if args.json_out:
-        Path(args.json_out).write_text(json.dumps({"results": results}, ensure_ascii=False, indent=2), encoding="utf-8")
+        write_json_report(results, Path(args.json_out))
 
     return 1 if total_err else 0
 